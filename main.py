@@ -1,11 +1,24 @@
 import os
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Optional
 from fastapi import FastAPI, HTTPException, BackgroundTasks, status
-from pydantic import BaseModel
+from pydantic import BaseModel, constr
+import google.auth
 from google.cloud.sql.connector import Connector, IPTypes
-import pg8000.dbapi
-import sqlalchemy
-from sqlalchemy.pool import NullPool # Recommended for serverless environments
+import asyncpg
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy import text # Import text for raw SQL execution
+from async_lru import alru_cache
+from google import genai
+
+# --- Logging ---
+# Configured once here; under uvicorn/gunicorn a --log-config can replace it
+# (e.g. with a JSON formatter for Cloud Logging).
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("search")
 
 # --- FastAPI App Initialization ---
 app = FastAPI(
@@ -20,12 +33,59 @@ ENV_DB_USER_KEY = "DB_USER"
 ENV_DB_PASS_KEY = "DB_PASS"
 ENV_DB_NAME_KEY = "DB_NAME"
 ENV_USE_PRIVATE_IP_KEY = "USE_PRIVATE_IP"
+ENV_DB_POOL_SIZE_KEY = "DB_POOL_SIZE"
+ENV_CLOUD_RUN_CONCURRENCY_KEY = "CLOUD_RUN_CONCURRENCY"
+ENV_WEB_CONCURRENCY_KEY = "WEB_CONCURRENCY" # Also read by gunicorn as its worker count
+ENV_DB_MAX_OVERFLOW_KEY = "DB_MAX_OVERFLOW"
+ENV_SEARCH_CACHE_TTL_KEY = "SEARCH_CACHE_TTL_SECONDS"
+ENV_EMBEDDING_CACHE_TTL_KEY = "EMBEDDING_CACHE_TTL_SECONDS"
+ENV_EMBEDDING_CACHE_MAXSIZE_KEY = "EMBEDDING_CACHE_MAXSIZE"
+ENV_HNSW_EF_SEARCH_KEY = "HNSW_EF_SEARCH"
+ENV_ANN_PROBES_KEY = "ANN_PROBES"
+ENV_SEARCH_TOP_K_KEY = "SEARCH_TOP_K"
+ENV_EMBEDDING_WORKERS_KEY = "EMBEDDING_WORKERS"
+ENV_VERTEX_AI_LOCATION_KEY = "VERTEX_AI_LOCATION"
 
 CLOUD_SQL_CONNECTION_NAME = os.environ.get(ENV_CLOUD_SQL_CONNECTION_NAME_KEY)
 DB_USER = os.environ.get(ENV_DB_USER_KEY)
 DB_PASS = os.environ.get(ENV_DB_PASS_KEY)
 DB_NAME = os.environ.get(ENV_DB_NAME_KEY)
 USE_PRIVATE_IP = os.environ.get(ENV_USE_PRIVATE_IP_KEY, "false").lower() == "true"
+# Must be the same model the embedding backfill uses in the database
+EMBEDDING_MODEL_NAME = "gemini-embedding-001"
+VERTEX_AI_LOCATION = os.environ.get(ENV_VERTEX_AI_LOCATION_KEY) # None = SDK default
+# Every gunicorn worker has its own pool, so the instance's Cloud Run --concurrency
+# is split across WEB_CONCURRENCY workers. An uncached search holds two connections
+# at once (text and embedding branches run concurrently), so each worker pools two
+# per request it may be serving: with the defaults (20 / 4) that is 2 x 5 = 10
+# connections per worker and at most 40 per instance.
+CLOUD_RUN_CONCURRENCY = int(os.environ.get(ENV_CLOUD_RUN_CONCURRENCY_KEY, 20))
+WEB_CONCURRENCY = int(os.environ.get(ENV_WEB_CONCURRENCY_KEY, 4))
+CONNECTIONS_PER_SEARCH = 2
+DB_POOL_SIZE = int(os.environ.get(
+    ENV_DB_POOL_SIZE_KEY,
+    CONNECTIONS_PER_SEARCH * max(1, -(-CLOUD_RUN_CONCURRENCY // WEB_CONCURRENCY)),
+))
+DB_MAX_OVERFLOW = int(os.environ.get(ENV_DB_MAX_OVERFLOW_KEY, 0))
+# Concurrent embedding backfill workers; each holds its own connection (outside the
+# search pool) for the whole run
+EMBEDDING_WORKERS = int(os.environ.get(ENV_EMBEDDING_WORKERS_KEY, 4))
+# Longer queries are rejected with 422 before touching the database
+SEARCH_QUERY_MAX_LENGTH = 128
+# Maximum number of IDs returned by /search-products
+SEARCH_TOP_K = int(os.environ.get(ENV_SEARCH_TOP_K_KEY, 20))
+# Per-process cache of /search-products results; each worker keeps its own copy
+SEARCH_CACHE_MAXSIZE = 1024
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get(ENV_SEARCH_CACHE_TTL_KEY, 60))
+# Query embeddings are deterministic per model, so they can be kept much longer.
+# Each cached 3072-dim literal is ~29 KB, so the default costs up to ~30 MB per worker.
+EMBEDDING_CACHE_MAXSIZE = int(os.environ.get(ENV_EMBEDDING_CACHE_MAXSIZE_KEY, 1000))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.environ.get(ENV_EMBEDDING_CACHE_TTL_KEY, 3600))
+# HNSW candidate list size (see migrations/): higher = better recall, slower scans.
+# Raised to SEARCH_TOP_K per connection if lower, since it also caps the rows returned.
+HNSW_EF_SEARCH = int(os.environ.get(ENV_HNSW_EF_SEARCH_KEY, 40))
+# IVFFlat lists probed per query, used when the optional IVFFlat index is installed instead
+ANN_PROBES = int(os.environ.get(ENV_ANN_PROBES_KEY, 10))
 
 # --- Validate essential environment variables ---
 if not all([CLOUD_SQL_CONNECTION_NAME, DB_USER, DB_PASS, DB_NAME]):
@@ -36,34 +96,142 @@ if not all([CLOUD_SQL_CONNECTION_NAME, DB_USER, DB_PASS, DB_NAME]):
     if DB_NAME is None: missing_vars.append(ENV_DB_NAME_KEY)
     raise ValueError(f"Missing one or more essential environment variables for database connection: {', '.join(missing_vars)}")
 
+# --- Vertex AI Embedding Client (query embeddings) ---
+@lru_cache(maxsize=1)
+def get_embedding_client() -> genai.Client:
+    """
+    Returns the process-wide Vertex AI client, created on first use.
+    Reusing it keeps one long-lived connection instead of reconnecting per query.
+    Construction resolves credentials synchronously; use embed_texts() from async code.
+    """
+    return genai.Client(vertexai=True, location=VERTEX_AI_LOCATION)
+
+async def embed_texts(texts: list[str]) -> list[list[float]]:
+    """Embeds texts with EMBEDDING_MODEL_NAME without blocking the event loop."""
+    if get_embedding_client.cache_info().currsize:
+        client = get_embedding_client()
+    else:
+        # First use (or a failed earlier attempt, which lru_cache does not keep)
+        client = await asyncio.to_thread(get_embedding_client)
+    response = await client.aio.models.embed_content(model=EMBEDDING_MODEL_NAME, contents=texts)
+    return [embedding.values for embedding in response.embeddings]
+
 # --- Cloud SQL Connector and SQLAlchemy Setup ---
-connector = Connector()
+CLOUD_SQL_SCOPES = ["https://www.googleapis.com/auth/sqlservice.admin"]
+
+_connector: Optional[Connector] = None
 
-def getconn() -> pg8000.dbapi.Connection:
+async def get_connector() -> Connector:
+    """
+    Returns the process-wide Cloud SQL Connector, creating it on first use.
+    It is bound to the running event loop, so nothing is opened at import time.
+    """
+    global _connector
+    if _connector is None:
+        # Connector() would call google.auth.default() itself, which does blocking
+        # file/metadata-server I/O; resolve credentials in a thread and hand them in.
+        # A failure leaves _connector unset, so the next connection retries off the loop too.
+        credentials, _ = await asyncio.to_thread(google.auth.default, scopes=CLOUD_SQL_SCOPES)
+        if _connector is None: # Another coroutine may have created it while this one waited
+            _connector = Connector(loop=asyncio.get_running_loop(), credentials=credentials)
+    return _connector
+
+async def getconn() -> asyncpg.Connection:
     """Function to establish a new database connection."""
+    conn: Optional[asyncpg.Connection] = None
     try:
-        conn: pg8000.dbapi.Connection = connector.connect(
+        connector = await get_connector()
+        conn = await connector.connect_async(
             CLOUD_SQL_CONNECTION_NAME,
-            "pg8000",
+            "asyncpg",
             user=DB_USER,
             password=DB_PASS,
             db=DB_NAME,
             ip_type=IPTypes.PRIVATE if USE_PRIVATE_IP else IPTypes.PUBLIC,
         )
+        # Session-level ANN tuning; applies to every query on this pooled connection.
+        # An HNSW scan returns at most ef_search rows, so it must cover SEARCH_TOP_K.
+        await conn.execute(f"SET hnsw.ef_search = {max(HNSW_EF_SEARCH, SEARCH_TOP_K)}")
+        await conn.execute(f"SET ivfflat.probes = {ANN_PROBES}")
         return conn
     except Exception as e:
-        print(f"Error establishing database connection: {e}")
+        logger.exception("Error establishing database connection")
+        if conn is not None:
+            # The connection never reaches the pool, so nothing else would close it
+            await conn.close()
         raise RuntimeError(f"Could not connect to database: {e}")
 
-db_pool = sqlalchemy.create_engine(
-    "postgresql+pg8000://",
-    creator=getconn,
-    poolclass=NullPool
+db_pool = create_async_engine(
+    "postgresql+asyncpg://",
+    async_creator=getconn,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=1700, # Connector certs live ~1h; recycle well before they expire
+    pool_pre_ping=True, # Detect connections dropped while the instance was idle/throttled
+)
+
+# The embedding backfill gets its own engine so its long-held connections never
+# compete with searches for db_pool slots. Each worker keeps one connection for
+# the whole run, so pooling would not save anything.
+backfill_pool = create_async_engine(
+    "postgresql+asyncpg://",
+    async_creator=getconn,
+    poolclass=NullPool,
 )
 
+# --- SQL Statements (built once at import, reused by every request) ---
+PING_STMT = text("SELECT 1")
+
+# The two search branches run as separate statements on separate connections so
+# they execute concurrently. Each is capped at the number of IDs the API returns;
+# merging and deduplication happen in Python (see merge_matches).
+TEXT_MATCH_STMT = text("""
+    SELECT external_id
+    FROM products
+    WHERE name_lc LIKE :query_text_pattern ESCAPE '\\' -- name_lc = lower(name), see migrations/003
+    LIMIT :top_k
+""")
+
+EMBEDDING_MATCH_STMT = text("""
+    SELECT external_id
+    FROM products
+    ORDER BY abstract_embeddings <=> CAST(:query_vector AS halfvec)
+    LIMIT :top_k
+""")
+
+# Updates products in batches and records the batch in the embedding_job counter
+# (migrations/002) within the same transaction.
+# SKIP LOCKED lets several workers (or instances) run this concurrently
+# without claiming the same rows.
+GENERATE_EMBEDDINGS_STMT = text("""
+    WITH updated AS (
+        UPDATE products
+        SET abstract_embeddings = embedding('gemini-embedding-001', name)::halfvec
+        WHERE id IN (
+            SELECT id
+            FROM products
+            WHERE abstract_embeddings IS NULL
+            ORDER BY id ASC
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id
+    ),
+    progress AS (
+        UPDATE embedding_job
+        SET products_embedded = products_embedded + (SELECT count(*) FROM updated),
+            updated_at = now()
+        WHERE id = 1
+    )
+    SELECT id FROM updated; -- Return IDs of updated rows to check progress
+""")
+
 # --- Pydantic Models for Request/Response Validation ---
 class SearchRequest(BaseModel):
-    query_text: str
+    # Whitespace is stripped before the length check, so blank queries (which would
+    # normalize to "" and match every product) are rejected with 422
+    query_text: constr(strip_whitespace=True, min_length=1, max_length=SEARCH_QUERY_MAX_LENGTH)
 
 class SearchResponse(BaseModel):
     ids: list[str]
@@ -73,57 +241,136 @@ class GenerateEmbeddingsResponse(BaseModel):
 
 # --- Background Task for Embedding Generation ---
 
-def generate_embeddings_sync(batch_size: int = 160):
+# Set for the duration of a backfill run so that repeated triggers can't stack
+# up workers. Per process only; across workers/instances SKIP LOCKED keeps runs
+# from claiming the same rows. A plain flag (rather than an asyncio.Lock) is
+# enough because it is only checked and set on the event loop, never awaited.
+_embedding_job_running = False
+
+async def _embedding_worker(worker_id: int, batch_size: int) -> int:
     """
-    Synchronous function to perform the embedding generation in batches.
-    This runs in a background thread managed by FastAPI.
+    Claims and embeds batches until no unclaimed products remain.
+    Returns the number of products this worker embedded.
     """
     total_products_embedded = 0
-    print("Starting background embedding generation...")
-
-    while True:
-        try:
-            with db_pool.connect() as connection:
-                # The SQL statement to update products in batches
-                sql_query = text(f"""
-                    UPDATE products
-                    SET abstract_embeddings = embedding('gemini-embedding-001', name)::vector
-                    WHERE id IN (
-                        SELECT id
-                        FROM products
-                        WHERE abstract_embeddings IS NULL
-                        ORDER BY id ASC
-                        LIMIT {batch_size}
-                    )
-                    RETURNING id; -- Return IDs of updated rows to check progress
-                """)
-
-                # Execute the update
-                result = connection.execute(sql_query)
-                updated_ids = result.scalars().all() # Get list of updated IDs
-
-                if not updated_ids:
-                    print("Embedding generation complete: No more products to process.")
-                    break # Exit loop if no rows were updated
-
-                num_updated = len(updated_ids)
-                total_products_embedded += num_updated
-                print(f"Embedded {num_updated} products in this batch. Total embedded: {total_products_embedded}")
-
-                # No explicit commit needed here with `with db_pool.connect() as connection:`
-                # as SQLAlchemy handles transactions for simple statements automatically,
-                # committing on success or rolling back on error within the `with` block.
-                # If you need multi-statement transactions, you'd use `connection.begin()`
-
-        except Exception as e:
-            print(f"Error during embedding generation batch processing: {e}")
-            # Log the specific error for debugging
+    # One connection is reused for every batch instead of
+    # opening one per iteration.
+    async with backfill_pool.connect() as connection:
+        while True:
+            # Execute the update
+            result = await connection.execute(GENERATE_EMBEDDINGS_STMT, {"batch_size": batch_size})
+            updated_ids = result.scalars().all() # Get list of updated IDs
+            # `connect()` does not autocommit; commit each batch so progress is kept
+            # (and row locks released) even if a later batch fails.
+            await connection.commit()
+
+            if not updated_ids:
+                return total_products_embedded # No unclaimed rows left
+
+            num_updated = len(updated_ids)
+            total_products_embedded += num_updated
+            logger.info("Worker %d embedded %d products in this batch. Worker total: %d", worker_id, num_updated, total_products_embedded)
+
+async def generate_embeddings(batch_size: int = 1000, workers: int = EMBEDDING_WORKERS):
+    """
+    Coroutine that performs the embedding generation in batches.
+    FastAPI runs it on the event loop after the response has been sent.
+    Several workers run concurrently, each on its own connection, so that
+    embedding-model calls for different batches overlap.
+    """
+    global _embedding_job_running
+    if _embedding_job_running:
+        # Another trigger slipped in before this run started; let that one finish
+        logger.info("Embedding generation already running; skipping this run.")
+        return
+
+    _embedding_job_running = True
+    try:
+        logger.info("Starting background embedding generation with %d workers...", workers)
+        results = await asyncio.gather(
+            *(_embedding_worker(i, batch_size) for i in range(workers)),
+            return_exceptions=True,
+        )
+    finally:
+        _embedding_job_running = False
+
+    for worker_id, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.error("Embedding worker %d failed", worker_id, exc_info=result)
             # Consider more robust error handling / retry logic here in a real app
-            break # Stop on error for now
 
-        # Optional: Add a small delay between batches to avoid overwhelming resources
-        # This is a synchronous sleep, it will block this background thread.
-        # time.sleep(0.5) # Import time if using this. For now, rely on API call latency.
+    total_products_embedded = sum(r for r in results if not isinstance(r, Exception))
+    logger.info("Embedding generation finished: %d products embedded in this run.", total_products_embedded)
+
+# --- Product Search (cached per normalized query) ---
+
+def normalize_query(query_text: str) -> str:
+    """
+    Lowercases and collapses whitespace so equivalent queries share a cache slot.
+    Punctuation is kept: it is significant for the LIKE text match.
+    """
+    return " ".join(query_text.lower().split())
+
+def escape_like(value: str) -> str:
+    """Escapes LIKE wildcards so user input is matched literally."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def merge_matches(text_ids: list[str], embedding_ids: list[str], top_k: int) -> list[str]:
+    """
+    Returns up to top_k IDs: text matches first, then embedding matches
+    (nearest first) that were not already matched by text.
+    """
+    ids = text_ids[:top_k]
+    seen = set(ids)
+    for external_id in embedding_ids:
+        if len(ids) >= top_k:
+            break
+        if external_id not in seen:
+            seen.add(external_id)
+            ids.append(external_id)
+    return ids
+
+@alru_cache(maxsize=EMBEDDING_CACHE_MAXSIZE, ttl=EMBEDDING_CACHE_TTL_SECONDS)
+async def get_query_embedding(normalized_text: str) -> str:
+    """
+    Returns the query embedding as a pgvector literal, computed once per text.
+    The Vertex AI call is made from the API, so it needs no DB connection and
+    keeps the model RPC off the database's CPU.
+    """
+    (values,) = await embed_texts([normalized_text])
+    # 6 decimals is well beyond what the halfvec column keeps, at about half the size of repr()
+    return "[" + ",".join(f"{x:.6f}" for x in values) + "]"
+
+async def _fetch_ids(statement, params: dict) -> list[str]:
+    """Runs a single-column ID query on a pooled connection."""
+    async with db_pool.connect() as connection:
+        result = await connection.execute(statement, params)
+        return result.scalars().all()
+
+async def _text_match(normalized_text: str) -> list[str]:
+    """Returns IDs of products whose name contains the query text."""
+    # normalized_text is already lowercased, matching name_lc
+    return await _fetch_ids(
+        TEXT_MATCH_STMT,
+        {"query_text_pattern": f"%{escape_like(normalized_text)}%", "top_k": SEARCH_TOP_K}
+    )
+
+async def _embedding_match(normalized_text: str) -> list[str]:
+    """Returns IDs of the products nearest to the query embedding, nearest first."""
+    query_vector = await get_query_embedding(normalized_text)
+    return await _fetch_ids(
+        EMBEDDING_MATCH_STMT,
+        {"query_vector": query_vector, "top_k": SEARCH_TOP_K}
+    )
+
+@alru_cache(maxsize=SEARCH_CACHE_MAXSIZE, ttl=SEARCH_CACHE_TTL_SECONDS)
+async def _search(normalized_text: str) -> list[str]:
+    """Runs the text and embedding searches concurrently. Failures are not cached."""
+    text_ids, embedding_ids = await asyncio.gather(
+        _text_match(normalized_text),
+        _embedding_match(normalized_text),
+    )
+    return merge_matches(text_ids, embedding_ids, SEARCH_TOP_K)
 
 # --- FastAPI Routes ---
 
@@ -131,11 +378,11 @@ def generate_embeddings_sync(batch_size: int = 160):
 async def health_check():
     """Simple health check endpoint that also pings the database."""
     try:
-        with db_pool.connect() as connection:
-            connection.execute(sqlalchemy.text("SELECT 1")) # Simple query to check connectivity
+        async with db_pool.connect() as connection:
+            await connection.execute(PING_STMT) # Simple query to check connectivity
         return {"status": "ok", "db_connection": "successful"}
     except Exception as e:
-        print(f"Health check failed due to database error: {e}")
+        logger.exception("Health check failed due to database error")
         raise HTTPException(status_code=503, detail=f"Service Unavailable: Database connection failed: {str(e)}")
 
 @app.post("/search-products", response_model=SearchResponse, status_code=200)
@@ -144,46 +391,13 @@ async def search_products(request_body: SearchRequest):
     Searches for product IDs based on the provided query text.
     Combines text-based and embedding-based matches, prioritizing text matches.
     """
-    query_text = request_body.query_text
-
-    sql_query = """
-    SELECT external_id
-    FROM (
-      SELECT DISTINCT ON (external_id) *
-      FROM (
-        (
-          SELECT 'text_match' AS source, external_id
-          FROM products
-          WHERE name ILIKE :query_text_pattern
-          LIMIT 100
-        )
-        UNION ALL
-        (
-          SELECT 'embedding_match' AS source, external_id
-          FROM products
-          ORDER BY abstract_embeddings <=> embedding('gemini-embedding-001', :query_text_embedding)::vector
-          LIMIT 100
-        )
-      ) combined
-      ORDER BY external_id, source DESC -- IMPORTANT: This prioritizes 'text_match' for deduplication
-    ) deduped
-    ORDER BY source DESC; -- This orders the final output by source (text_match first)
-    """
-
-    ids = []
     try:
-        with db_pool.connect() as connection:
-            result = connection.execute(
-                text(sql_query), # Use text() for raw SQL
-                {
-                    "query_text_pattern": f"%{query_text}%",
-                    "query_text_embedding": query_text
-                }
-            )
-            ids = [row.external_id for row in result.fetchall()]
-        return SearchResponse(ids=ids)
+        ids = await _search(normalize_query(request_body.query_text))
+        # response_model validates and serializes this straight to JSON bytes via
+        # pydantic-core; building a SearchResponse here would only be validated again
+        return {"ids": ids}
     except Exception as e:
-        print(f"Database query error in search_products: {e}")
+        logger.exception("Database query error in search_products")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve IDs: {str(e)}")
 
 @app.post("/products/generate-embeddings", response_model=GenerateEmbeddingsResponse, status_code=status.HTTP_202_ACCEPTED)
@@ -192,30 +406,64 @@ async def trigger_embedding_generation(
 ):
     """
     Triggers the generation of embeddings for product names in the background.
-    This endpoint returns immediately with a 202 Accepted status.
+    This endpoint returns immediately with a 202 Accepted status,
+    or 409 Conflict if a run is already in progress in this process.
     """
+    if _embedding_job_running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Embedding generation is already running.")
+
     # The batch size for the SQL update
     BATCH_SIZE = 1600 # Your requested limit
 
-    # Add the synchronous function to FastAPI's background tasks
-    # FastAPI will run this function in a separate thread,
-    # preventing the main event loop from blocking.
-    background_tasks.add_task(generate_embeddings_sync, batch_size)
+    # Add the coroutine to FastAPI's background tasks
+    # FastAPI awaits it after the response is sent; all DB I/O is non-blocking,
+    # so the event loop keeps serving other requests meanwhile.
+    background_tasks.add_task(generate_embeddings, BATCH_SIZE)
 
-    return {"message": f"Embedding generation started in the background with batch size {BATCH_SIZE}. Check service logs for progress."}
+    return {"message": f"Embedding generation started in the background with {EMBEDDING_WORKERS} workers and batch size {BATCH_SIZE}. Check service logs or the embedding_job table for progress."}
 
 
+# --- Startup / cleanup for Cloud Run instance lifecycle ---
+async def _warm_connection():
+    """Checks out one pooled connection and runs a warm-up query on it."""
+    async with db_pool.connect() as connection:
+        await connection.execute(PING_STMT)
+
+async def _warm_embedding_model():
+    """Creates the embedding client and makes one call to open its connection."""
+    await embed_texts(["warmup"])
+
+@app.on_event("startup")
+async def startup_event():
+    """Warms the database pool (and with it the Cloud SQL Connector) and the embedding model."""
+    # Open (and return to the pool) this worker's DB_POOL_SIZE connections concurrently so the
+    # first requests after a cold start don't pay the connector handshake, and
+    # make one embedding call so the Vertex AI channel is already established.
+    # Pair with Cloud Run --min-instances=1 and always-allocated CPU to keep them warm.
+    embedding_result, *results = await asyncio.gather(
+        _warm_embedding_model(),
+        *(_warm_connection() for _ in range(DB_POOL_SIZE)),
+        return_exceptions=True,
+    )
+    if isinstance(embedding_result, Exception):
+        logger.warning("Could not warm embedding model at startup: %s", embedding_result)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        logger.warning("Could not warm %d/%d pooled connections at startup: %s", len(errors), DB_POOL_SIZE, errors[0])
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Disposes the engine and closes the Cloud SQL Connector when the application shuts down."""
+    logger.info("Shutting down: Closing Cloud SQL Connector...")
+    await db_pool.dispose()
+    await backfill_pool.dispose()
+    if _connector is not None:
+        await _connector.close_async()
+    logger.info("Cloud SQL Connector closed.")
+
 # This block is for local development only.
 # Cloud Run will use gunicorn/uvicorn to run the app.
 if __name__ == "__main__":
     import uvicorn
     # Use the PORT environment variable provided by Cloud Run
     uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
-
-# --- Cleanup for Cloud Run instance shutdown ---
-@app.on_event("shutdown")
-def shutdown_event():
-    """Closes the Cloud SQL Connector when the application shuts down."""
-    print("Shutting down: Closing Cloud SQL Connector...")
-    connector.close()
-    print("Cloud SQL Connector closed.")
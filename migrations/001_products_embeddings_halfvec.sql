@@ -0,0 +1,18 @@
+-- Store abstract_embeddings as half precision (pgvector >= 0.7) and build the HNSW index
+-- for the embedding-match branch of /search-products.
+-- gemini-embedding-001 returns 3072 dimensions by default, beyond the 2000 pgvector's HNSW
+-- accepts for `vector` but within halfvec's 4000, so the index can only be built after the
+-- conversion; adjust the typmod if the model is configured with a different dimensionality.
+-- The operator class must match the `<=>` (cosine distance) operator used in the query.
+-- Validate recall@10 against an exact (unindexed) fp32 search before rolling out, and verify
+-- with EXPLAIN (ANALYZE, BUFFERS) that the search uses "Index Scan using idx_products_emb_hnsw".
+-- The ALTER rewrites the table under an ACCESS EXCLUSIVE lock; schedule accordingly.
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block: run with autocommit.
+
+ALTER TABLE products
+    ALTER COLUMN abstract_embeddings TYPE halfvec(3072)
+    USING abstract_embeddings::halfvec(3072);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_emb_hnsw
+    ON products USING hnsw (abstract_embeddings halfvec_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
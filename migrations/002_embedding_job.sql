@@ -0,0 +1,11 @@
+-- Single-row progress counter for the embedding backfill (/products/generate-embeddings).
+-- Each committed batch adds its row count, so progress survives restarts and is
+-- visible across instances: SELECT * FROM embedding_job;
+
+CREATE TABLE IF NOT EXISTS embedding_job (
+    id integer PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    products_embedded bigint NOT NULL DEFAULT 0,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+INSERT INTO embedding_job (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
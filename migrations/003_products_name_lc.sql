@@ -0,0 +1,13 @@
+-- Pre-lowercased copy of products.name plus a trigram GIN index for the text-match branch
+-- of /search-products, so the query can use LIKE on name_lc (leading wildcard included)
+-- instead of case-folding every row with ILIKE or scanning the table.
+-- The ADD COLUMN rewrites the table under an ACCESS EXCLUSIVE lock; schedule accordingly.
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block: run with autocommit.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS name_lc text GENERATED ALWAYS AS (lower(name)) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_name_lc_trgm
+    ON products USING gin (name_lc gin_trgm_ops);
@@ -0,0 +1,11 @@
+-- Alternative to the HNSW index (001) for very large products tables, where HNSW
+-- build time and memory become prohibitive. Apply instead of, not in addition to, HNSW.
+-- Run only once the table is populated: IVFFlat derives its lists from existing rows.
+-- Rule of thumb: lists = rows / 1000 up to 1M rows, sqrt(rows) beyond that.
+-- Query-time recall/speed is tuned with ivfflat.probes, set per connection from ANN_PROBES.
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_products_emb_hnsw;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_emb_ivfflat
+    ON products USING ivfflat (abstract_embeddings halfvec_cosine_ops)
+    WITH (lists = 1000);